@@ -1,35 +1,158 @@
 import psycopg2
+import psycopg2.extensions
+import psycopg2.extras
+import psycopg2.pool
 import os
+import calendar
+import datetime
+import threading
+import weakref
+from contextlib import contextmanager
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# Decode NUMERIC/DECIMAL columns straight to float instead of building a
+# Decimal for every value; amounts are only ever displayed and charted as floats.
+DEC2FLOAT = psycopg2.extensions.new_type(
+    psycopg2.extensions.DECIMAL.values,
+    'DEC2FLOAT',
+    lambda value, cursor: float(value) if value is not None else None
+)
+psycopg2.extensions.register_type(DEC2FLOAT)
+
+def month_bounds(month, year):
+    """
+    Returns the first day of the given month and the first day of the following month.
+    """
+    start = datetime.date(int(year), int(month), 1)
+    end = start + datetime.timedelta(days=calendar.monthrange(start.year, start.month)[1])
+    return start, end
+
 class DatabaseManager:
     """
     Manages all database operations for the expense and budget management system.
     """
-    def __init__(self):
-        self.conn = None
-        self.cursor = None
+    # Bump whenever create_tables changes, so existing databases pick up the new DDL.
+    SCHEMA_VERSION = 1
+
+    # Hot single-row writes, prepared once per connection so PostgreSQL skips
+    # parsing and planning on every call.
+    PREPARED_STATEMENTS = {
+        "add_expense_stmt": (
+            "(DATE, DECIMAL, VARCHAR, VARCHAR)",
+            "INSERT INTO expenses (date, amount, category, payment_method) VALUES ($1, $2, $3, $4)"
+        ),
+        "update_expense_stmt": (
+            "(DATE, DECIMAL, VARCHAR, VARCHAR, INTEGER)",
+            "UPDATE expenses SET date = $1, amount = $2, category = $3, payment_method = $4 WHERE id = $5"
+        ),
+        "delete_expense_stmt": (
+            "(INTEGER)",
+            "DELETE FROM expenses WHERE id = $1"
+        ),
+        "add_budget_stmt": (
+            "(VARCHAR, DECIMAL, DECIMAL)",
+            """
+            INSERT INTO budgets (category, monthly_budget, annual_budget)
+            VALUES ($1, $2, $3)
+            ON CONFLICT (category) DO UPDATE SET
+            monthly_budget = EXCLUDED.monthly_budget,
+            annual_budget = EXCLUDED.annual_budget
+            """
+        ),
+    }
+
+    def __init__(self, minconn=1, maxconn=10):
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.pool = None
+        self.read_pool = None
+        # Weak references, so connections the pool closes are dropped automatically.
+        self.prepared_connections = weakref.WeakSet()
+        self.refresh_lock = threading.Lock()
+        self.refresh_pending = False
+        self.refresh_running = False
+        # Bumped after every committed refresh of mv_monthly_category, so
+        # callers can tell when cached view contents are out of date.
+        self.refresh_generation = 0
         self.connect()
 
     def connect(self):
         """
-        Establishes a connection to the PostgreSQL database.
+        Creates thread-safe pools of connections to the PostgreSQL database:
+        one for transactional writes and one for read-only autocommit queries.
+        Raises psycopg2.Error if the database cannot be reached.
         """
+        params = dict(
+            dbname=os.getenv("expense tracker"),
+            user=os.getenv("postgres"),
+            password=os.getenv("vardhini"),
+            host=os.getenv("localhost"),
+            port=os.getenv("5432"),
+            cursor_factory=psycopg2.extras.NamedTupleCursor
+        )
         try:
-            self.conn = psycopg2.connect(
-                dbname=os.getenv("expense tracker"),
-                user=os.getenv("postgres"),
-                password=os.getenv("vardhini"),
-                host=os.getenv("localhost"),
-                port=os.getenv("5432")
-            )
-            self.cursor = self.conn.cursor()
+            self.pool = psycopg2.pool.ThreadedConnectionPool(self.minconn, self.maxconn, **params)
+            self.read_pool = psycopg2.pool.ThreadedConnectionPool(self.minconn, self.maxconn, **params)
             print("Database connection successful.")
-            self.create_tables()
+            if not self.schema_is_current():
+                self.create_tables()
         except psycopg2.Error as e:
             print(f"Error connecting to the database: {e}")
+            self.close()
+            raise
+
+    @contextmanager
+    def _cursor(self, name=None, readonly=False):
+        """
+        Borrows a connection from the pool and yields a cursor on it.
+        Passing a name opens a server-side cursor.
+        Read-only cursors come from the read pool, whose connections run in
+        autocommit mode so plain SELECTs skip the implicit BEGIN/COMMIT.
+        Otherwise the transaction is committed on success and rolled back on error.
+        The connection is always returned to its pool.
+        """
+        pool = self.read_pool if readonly else self.pool
+        conn = pool.getconn()
+        try:
+            if readonly and not conn.autocommit:
+                conn.set_session(readonly=True, autocommit=True)
+            with conn:
+                with conn.cursor(name=name) as cursor:
+                    yield cursor
+        finally:
+            pool.putconn(conn)
+
+    def _execute_prepared(self, cursor, name, params):
+        """
+        Executes a prepared statement, preparing all statements on the
+        cursor's connection the first time it is used. Any statements left
+        over from an earlier, partly failed attempt are deallocated first.
+        """
+        if cursor.connection not in self.prepared_connections:
+            cursor.execute("DEALLOCATE ALL")
+            for stmt_name, (arg_types, stmt_sql) in self.PREPARED_STATEMENTS.items():
+                cursor.execute(f"PREPARE {stmt_name} {arg_types} AS {stmt_sql}")
+            self.prepared_connections.add(cursor.connection)
+        placeholders = ", ".join(["%s"] * len(params))
+        cursor.execute(f"EXECUTE {name} ({placeholders})", params)
+
+    def schema_is_current(self):
+        """
+        Checks whether the schema recorded in the database matches SCHEMA_VERSION.
+        """
+        try:
+            with self._cursor(readonly=True) as cursor:
+                cursor.execute("SELECT to_regclass('schema_version') IS NOT NULL")
+                if not cursor.fetchone()[0]:
+                    return False
+                cursor.execute("SELECT version FROM schema_version")
+                row = cursor.fetchone()
+                return row is not None and row.version >= self.SCHEMA_VERSION
+        except psycopg2.Error as e:
+            print(f"Error checking the schema version: {e}")
+            return False
 
     def create_tables(self):
         """
@@ -45,6 +168,10 @@ class DatabaseManager:
                 payment_method VARCHAR(50) NOT NULL
             )
             """,
+            # Block writes to expenses until this transaction commits, so no row
+            # can land between seeding category_stats and creating its triggers.
+            # It follows the CREATE only because LOCK needs the table to exist.
+            "LOCK TABLE expenses IN SHARE ROW EXCLUSIVE MODE",
             """
             CREATE TABLE IF NOT EXISTS budgets (
                 id SERIAL PRIMARY KEY,
@@ -60,29 +187,156 @@ class DatabaseManager:
                 amount DECIMAL(10, 2) NOT NULL,
                 source VARCHAR(100) NOT NULL
             )
+            """,
+            "CREATE INDEX IF NOT EXISTS idx_expenses_date ON expenses(date)",
+            "CREATE INDEX IF NOT EXISTS idx_expenses_cat_date ON expenses(category, date) INCLUDE (amount)",
+            # MAX/MIN on the dashboard become index endpoint lookups.
+            "CREATE INDEX IF NOT EXISTS idx_expenses_amount ON expenses(amount)",
+            # Running count and sum of expenses per category, kept current by
+            # triggers so the dashboard never scans expenses for them. One row
+            # per category keeps concurrent writers from queueing on a single row.
+            """
+            CREATE TABLE IF NOT EXISTS category_stats (
+                category VARCHAR(50) PRIMARY KEY,
+                total_count BIGINT NOT NULL,
+                total_sum DECIMAL(14, 2) NOT NULL
+            )
+            """,
+            """
+            INSERT INTO category_stats (category, total_count, total_sum)
+            SELECT category, COUNT(*), SUM(amount) FROM expenses GROUP BY category
+            ON CONFLICT (category) DO NOTHING
+            """,
+            """
+            CREATE OR REPLACE FUNCTION update_category_stats() RETURNS TRIGGER AS $$
+            BEGIN
+                IF TG_OP = 'TRUNCATE' THEN
+                    DELETE FROM category_stats;
+                    RETURN NULL;
+                END IF;
+                IF TG_OP IN ('DELETE', 'UPDATE') THEN
+                    UPDATE category_stats
+                    SET total_count = total_count - 1, total_sum = total_sum - OLD.amount
+                    WHERE category = OLD.category;
+                END IF;
+                IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                    INSERT INTO category_stats (category, total_count, total_sum)
+                    VALUES (NEW.category, 1, NEW.amount)
+                    ON CONFLICT (category) DO UPDATE SET
+                    total_count = category_stats.total_count + 1,
+                    total_sum = category_stats.total_sum + EXCLUDED.total_sum;
+                END IF;
+                RETURN NULL;
+            END;
+            $$ LANGUAGE plpgsql
+            """,
+            "DROP TRIGGER IF EXISTS trg_category_stats ON expenses",
+            """
+            CREATE TRIGGER trg_category_stats
+            AFTER INSERT OR UPDATE OF amount, category OR DELETE ON expenses
+            FOR EACH ROW EXECUTE FUNCTION update_category_stats()
+            """,
+            "DROP TRIGGER IF EXISTS trg_category_stats_truncate ON expenses",
+            """
+            CREATE TRIGGER trg_category_stats_truncate
+            AFTER TRUNCATE ON expenses
+            FOR EACH STATEMENT EXECUTE FUNCTION update_category_stats()
+            """,
+            # Pre-aggregated monthly totals per category for the dashboard charts.
+            """
+            CREATE MATERIALIZED VIEW IF NOT EXISTS mv_monthly_category AS
+            SELECT date_trunc('month', date) AS month, category, SUM(amount) AS total
+            FROM expenses
+            GROUP BY 1, 2
+            """,
+            "CREATE UNIQUE INDEX IF NOT EXISTS idx_mv_monthly_category ON mv_monthly_category(month, category)",
+            """
+            CREATE TABLE IF NOT EXISTS schema_version (
+                id BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (id),
+                version INTEGER NOT NULL
+            )
             """
         )
         try:
-            for command in commands:
-                self.cursor.execute(command)
-            self.conn.commit()
+            with self._cursor() as cursor:
+                for command in commands:
+                    cursor.execute(command)
+                cursor.execute(
+                    """
+                    INSERT INTO schema_version (version) VALUES (%s)
+                    ON CONFLICT (id) DO UPDATE SET version = EXCLUDED.version
+                    """,
+                    (self.SCHEMA_VERSION,)
+                )
             print("Tables created successfully.")
         except psycopg2.Error as e:
             print(f"Error creating tables: {e}")
-            self.conn.rollback()
+
+    def refresh_monthly_category(self):
+        """
+        Refreshes the monthly category totals without blocking readers.
+        """
+        try:
+            with self._cursor() as cursor:
+                cursor.execute("REFRESH MATERIALIZED VIEW CONCURRENTLY mv_monthly_category")
+            with self.refresh_lock:
+                self.refresh_generation += 1
+        except psycopg2.Error as e:
+            print(f"Error refreshing monthly category totals: {e}")
+
+    def _schedule_refresh(self):
+        """
+        Refreshes the monthly category totals in a background thread.
+        Writes that arrive while a refresh is running are coalesced into one follow-up refresh.
+        """
+        with self.refresh_lock:
+            self.refresh_pending = True
+            if self.refresh_running:
+                return
+            self.refresh_running = True
+        threading.Thread(target=self._refresh_worker, daemon=True).start()
+
+    def _refresh_worker(self):
+        """
+        Keeps refreshing until no further refresh has been requested.
+        """
+        while True:
+            with self.refresh_lock:
+                if not self.refresh_pending:
+                    self.refresh_running = False
+                    return
+                self.refresh_pending = False
+            self.refresh_monthly_category()
 
     def add_expense(self, date, amount, category, payment_method):
         """
         Adds a new expense record.
         """
-        sql = "INSERT INTO expenses (date, amount, category, payment_method) VALUES (%s, %s, %s, %s)"
         try:
-            self.cursor.execute(sql, (date, amount, category, payment_method))
-            self.conn.commit()
+            with self._cursor() as cursor:
+                self._execute_prepared(cursor, "add_expense_stmt", (date, amount, category, payment_method))
+            self._schedule_refresh()
             return True
         except psycopg2.Error as e:
             print(f"Error adding expense: {e}")
-            self.conn.rollback()
+            return False
+
+    def add_expenses_bulk(self, rows, page_size=1000):
+        """
+        Adds many expense records in a single transaction.
+        Each row is a (date, amount, category, payment_method) tuple.
+        """
+        sql = "INSERT INTO expenses (date, amount, category, payment_method) VALUES %s"
+        # Each row locks its category's category_stats row; inserting in category
+        # order makes concurrent writers take those locks in the same order.
+        rows = sorted(rows, key=lambda row: row[2])
+        try:
+            with self._cursor() as cursor:
+                psycopg2.extras.execute_values(cursor, sql, rows, page_size=page_size)
+            self._schedule_refresh()
+            return True
+        except psycopg2.Error as e:
+            print(f"Error adding expenses in bulk: {e}")
             return False
 
     def get_expenses(self):
@@ -91,58 +345,92 @@ class DatabaseManager:
         """
         sql = "SELECT id, date, amount, category, payment_method FROM expenses ORDER BY date DESC"
         try:
-            self.cursor.execute(sql)
-            return self.cursor.fetchall()
+            with self._cursor(readonly=True) as cursor:
+                cursor.execute(sql)
+                return cursor.fetchall()
         except psycopg2.Error as e:
             print(f"Error retrieving expenses: {e}")
             return []
 
+    def get_expenses_page(self, limit, offset=0):
+        """
+        Retrieves one page of expense records, newest first.
+        """
+        sql = """
+        SELECT id, date, amount, category, payment_method FROM expenses
+        ORDER BY date DESC, id DESC
+        LIMIT %s OFFSET %s
+        """
+        try:
+            with self._cursor(readonly=True) as cursor:
+                cursor.execute(sql, (limit, offset))
+                return cursor.fetchall()
+        except psycopg2.Error as e:
+            print(f"Error retrieving expenses page: {e}")
+            return []
+
+    def get_expense_count(self):
+        """
+        Returns the number of expense records.
+        """
+        try:
+            with self._cursor(readonly=True) as cursor:
+                cursor.execute("SELECT COALESCE(SUM(total_count), 0)::bigint AS total_count FROM category_stats")
+                return cursor.fetchone().total_count
+        except psycopg2.Error as e:
+            print(f"Error counting expenses: {e}")
+            return 0
+
+    def iter_expenses(self, itersize=5000):
+        """
+        Yields all expense records through a server-side cursor,
+        fetching itersize rows at a time instead of the whole table.
+        Unlike the other methods, database errors are raised to the caller,
+        since a stream that stops early would otherwise look complete.
+        """
+        sql = "SELECT id, date, amount, category, payment_method FROM expenses ORDER BY date DESC, id DESC"
+        # Named cursors need a transaction, so this read stays on the write pool.
+        with self._cursor(name="stream_expenses") as cursor:
+            cursor.itersize = itersize
+            cursor.execute(sql)
+            yield from cursor
+
     def update_expense(self, expense_id, date, amount, category, payment_method):
         """
         Updates an existing expense record.
         """
-        sql = "UPDATE expenses SET date = %s, amount = %s, category = %s, payment_method = %s WHERE id = %s"
         try:
-            self.cursor.execute(sql, (date, amount, category, payment_method, expense_id))
-            self.conn.commit()
+            with self._cursor() as cursor:
+                self._execute_prepared(cursor, "update_expense_stmt", (date, amount, category, payment_method, expense_id))
+            self._schedule_refresh()
             return True
         except psycopg2.Error as e:
             print(f"Error updating expense: {e}")
-            self.conn.rollback()
             return False
 
     def delete_expense(self, expense_id):
         """
         Deletes an expense record.
         """
-        sql = "DELETE FROM expenses WHERE id = %s"
         try:
-            self.cursor.execute(sql, (expense_id,))
-            self.conn.commit()
+            with self._cursor() as cursor:
+                self._execute_prepared(cursor, "delete_expense_stmt", (expense_id,))
+            self._schedule_refresh()
             return True
         except psycopg2.Error as e:
             print(f"Error deleting expense: {e}")
-            self.conn.rollback()
             return False
 
     def add_budget(self, category, monthly_budget, annual_budget):
         """
         Adds or updates a budget for a specific category.
         """
-        sql = """
-        INSERT INTO budgets (category, monthly_budget, annual_budget)
-        VALUES (%s, %s, %s)
-        ON CONFLICT (category) DO UPDATE SET
-        monthly_budget = EXCLUDED.monthly_budget,
-        annual_budget = EXCLUDED.annual_budget
-        """
         try:
-            self.cursor.execute(sql, (category, monthly_budget, annual_budget))
-            self.conn.commit()
+            with self._cursor() as cursor:
+                self._execute_prepared(cursor, "add_budget_stmt", (category, monthly_budget, annual_budget))
             return True
         except psycopg2.Error as e:
             print(f"Error setting budget: {e}")
-            self.conn.rollback()
             return False
 
     def get_budgets(self):
@@ -151,8 +439,9 @@ class DatabaseManager:
         """
         sql = "SELECT category, monthly_budget, annual_budget FROM budgets"
         try:
-            self.cursor.execute(sql)
-            return self.cursor.fetchall()
+            with self._cursor(readonly=True) as cursor:
+                cursor.execute(sql)
+                return cursor.fetchall()
         except psycopg2.Error as e:
             print(f"Error retrieving budgets: {e}")
             return []
@@ -162,25 +451,76 @@ class DatabaseManager:
         Calculates total spending for each category for a given month and year.
         """
         sql = """
-        SELECT category, SUM(amount) FROM expenses
-        WHERE EXTRACT(MONTH FROM date) = %s AND EXTRACT(YEAR FROM date) = %s
+        SELECT category, SUM(amount) AS total FROM expenses
+        WHERE date >= %s AND date < %s
         GROUP BY category
         """
         try:
-            self.cursor.execute(sql, (month, year))
-            return self.cursor.fetchall()
+            with self._cursor(readonly=True) as cursor:
+                cursor.execute(sql, month_bounds(month, year))
+                return cursor.fetchall()
         except psycopg2.Error as e:
             print(f"Error getting monthly spending by category: {e}")
             return []
-    
+
+    def get_budget_status(self, month, year):
+        """
+        Retrieves each budget alongside its total spending for a given month and year.
+        """
+        sql = """
+        SELECT b.category, b.monthly_budget, b.annual_budget, COALESCE(SUM(e.amount), 0) AS spending
+        FROM budgets b
+        LEFT JOIN expenses e ON e.category = b.category
+            AND e.date >= %s AND e.date < %s
+        GROUP BY b.category, b.monthly_budget, b.annual_budget
+        """
+        try:
+            with self._cursor(readonly=True) as cursor:
+                cursor.execute(sql, month_bounds(month, year))
+                return cursor.fetchall()
+        except psycopg2.Error as e:
+            print(f"Error getting budget status: {e}")
+            return []
+
+    def get_category_totals(self):
+        """
+        Calculates total spending for each category across all expenses.
+        """
+        sql = "SELECT category, SUM(total) AS total FROM mv_monthly_category GROUP BY category"
+        try:
+            with self._cursor(readonly=True) as cursor:
+                cursor.execute(sql)
+                return cursor.fetchall()
+        except psycopg2.Error as e:
+            print(f"Error getting category totals: {e}")
+            return []
+
+    def get_monthly_totals(self):
+        """
+        Calculates total spending for each month, oldest first.
+        """
+        sql = """
+        SELECT to_char(month, 'YYYY-MM') AS month, SUM(total) AS total FROM mv_monthly_category
+        GROUP BY month
+        ORDER BY month
+        """
+        try:
+            with self._cursor(readonly=True) as cursor:
+                cursor.execute(sql)
+                return cursor.fetchall()
+        except psycopg2.Error as e:
+            print(f"Error getting monthly totals: {e}")
+            return []
+
     def get_total_income(self):
         """
         Calculates the total income from the income table.
         """
-        sql = "SELECT SUM(amount) FROM income"
+        sql = "SELECT COALESCE(SUM(amount), 0)::float8 AS total_income FROM income"
         try:
-            self.cursor.execute(sql)
-            return self.cursor.fetchone()[0] or 0.0
+            with self._cursor(readonly=True) as cursor:
+                cursor.execute(sql)
+                return cursor.fetchone().total_income
         except psycopg2.Error as e:
             print(f"Error calculating total income: {e}")
             return 0.0
@@ -189,41 +529,37 @@ class DatabaseManager:
         """
         Provides business insights using aggregate functions.
         """
-        insights = {}
-        try:
-            # Total Expenses
-            self.cursor.execute("SELECT SUM(amount) FROM expenses")
-            insights['total_expenses'] = self.cursor.fetchone()[0] or 0.0
-
-            # Average Daily Expense
-            self.cursor.execute("SELECT AVG(amount) FROM expenses")
-            insights['avg_daily_expense'] = self.cursor.fetchone()[0] or 0.0
-
-            # Max Expense
-            self.cursor.execute("SELECT MAX(amount) FROM expenses")
-            insights['max_expense'] = self.cursor.fetchone()[0] or 0.0
-
-            # Min Expense
-            self.cursor.execute("SELECT MIN(amount) FROM expenses")
-            insights['min_expense'] = self.cursor.fetchone()[0] or 0.0
-            
-            # Number of Transactions
-            self.cursor.execute("SELECT COUNT(*) FROM expenses")
-            insights['total_transactions'] = self.cursor.fetchone()[0] or 0
-
-            # Total Budgeted Amount
-            self.cursor.execute("SELECT SUM(monthly_budget) FROM budgets")
-            insights['total_monthly_budget'] = self.cursor.fetchone()[0] or 0.0
-
-            # Total Income
-            self.cursor.execute("SELECT SUM(amount) FROM income")
-            insights['total_income'] = self.cursor.fetchone()[0] or 0.0
-            
-            # Category with most expenses
-            self.cursor.execute("SELECT category FROM expenses GROUP BY category ORDER BY SUM(amount) DESC LIMIT 1")
-            most_spent_category = self.cursor.fetchone()
-            insights['most_spent_category'] = most_spent_category[0] if most_spent_category else "N/A"
+        sql = """
+        WITH totals AS (
+            SELECT COALESCE(SUM(total_count), 0) AS total_count, COALESCE(SUM(total_sum), 0) AS total_sum
+            FROM category_stats
+        )
+        SELECT
+            t.total_sum::float8 AS total_expenses,
+            COALESCE(t.total_sum / NULLIF(t.total_count, 0), 0)::float8 AS avg_daily_expense,
+            COALESCE((SELECT MAX(amount) FROM expenses), 0)::float8 AS max_expense,
+            COALESCE((SELECT MIN(amount) FROM expenses), 0)::float8 AS min_expense,
+            t.total_count::bigint AS total_transactions,
+            COALESCE((SELECT SUM(monthly_budget) FROM budgets), 0)::float8 AS total_monthly_budget,
+            COALESCE((SELECT SUM(amount) FROM income), 0)::float8 AS total_income,
+            (SELECT category FROM category_stats WHERE total_count > 0 ORDER BY total_sum DESC LIMIT 1) AS most_spent_category
+        FROM totals t
+        """
+        try:
+            with self._cursor(readonly=True) as cursor:
+                cursor.execute(sql)
+                row = cursor.fetchone()
 
+            insights = {
+                'total_expenses': row.total_expenses,
+                'avg_daily_expense': row.avg_daily_expense,
+                'max_expense': row.max_expense,
+                'min_expense': row.min_expense,
+                'total_transactions': row.total_transactions,
+                'total_monthly_budget': row.total_monthly_budget,
+                'total_income': row.total_income,
+                'most_spent_category': row.most_spent_category or "N/A",
+            }
             return insights
 
         except psycopg2.Error as e:
@@ -232,9 +568,11 @@ class DatabaseManager:
 
     def close(self):
         """
-        Closes the database connection.
+        Closes all pooled database connections.
         """
-        if self.conn:
-            self.cursor.close()
-            self.conn.close()
+        if self.read_pool:
+            self.read_pool.closeall()
+        if self.pool:
+            self.pool.closeall()
+            self.prepared_connections.clear()
             print("Database connection closed.")
\ No newline at end of file
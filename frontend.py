@@ -1,11 +1,18 @@
 import streamlit as st
-import pandas as pd
 import datetime
-import calendar
+import csv
+import io
+import math
+import threading
+import psycopg2
 from backend import DatabaseManager
 
-# --- Initialize ---
-db = DatabaseManager()
+CATEGORIES = ("Food", "Transport", "Rent", "Entertainment", "Utilities", "Other")
+CATEGORY_INDEX = {category: i for i, category in enumerate(CATEGORIES)}
+PAYMENT_METHODS = ("Credit Card", "Debit Card", "Cash", "Online Transfer")
+PAYMENT_METHOD_INDEX = {method: i for i, method in enumerate(PAYMENT_METHODS)}
+EXPENSE_COLUMNS = ["ID", "Date", "Amount", "Category", "Payment Method"]
+TRANSACTIONS_PAGE_SIZE = 50
 
 # --- Page Configuration ---
 st.set_page_config(
@@ -14,12 +21,114 @@ st.set_page_config(
     layout="wide",
 )
 
+# --- Initialize ---
+@st.cache_resource(show_spinner=False)
+def get_database_manager():
+    """
+    Creates one pooled DatabaseManager shared across reruns and sessions.
+    A failed connection raises, so it is not cached and the next rerun retries.
+    """
+    return DatabaseManager()
+
+try:
+    db = get_database_manager()
+except psycopg2.Error:
+    st.error("Could not connect to the database. Please check the connection settings and reload. 😥")
+    st.stop()
+
+# --- Cached Reads ---
+# Read queries are memoized with st.cache_data, which is shared by all sessions,
+# and keyed by a process-wide data version that every successful write bumps.
+# Reruns reuse results until any session in this process writes. The TTL bounds
+# how long changes made outside this process can go unseen. Results must be
+# picklable, so named-tuple rows are turned into DataFrames or plain tuples
+# before caching. pandas is imported inside the functions that need it to keep
+# it off the startup path.
+#
+# The chart loaders read mv_monthly_category, which is refreshed in the
+# background after writes. They are keyed by the manager's refresh generation
+# instead of the data version, so a chart is re-read once the refresh has
+# committed rather than cached from the old view contents.
+
+@st.cache_resource(show_spinner=False)
+def get_data_version_state():
+    """Holds the data version shared by every session in this process."""
+    return {'lock': threading.Lock(), 'version': 0}
+
+def data_version():
+    """Returns the current process-wide data version."""
+    return get_data_version_state()['version']
+
+def bump_data_version():
+    """Invalidates cached reads for every session after a successful write."""
+    state = get_data_version_state()
+    with state['lock']:
+        state['version'] += 1
+
+@st.cache_data(ttl=60, show_spinner=False)
+def load_expenses_df(limit, offset, version):
+    """Loads a page of expenses into a DataFrame indexed by ID, with typed Date and Amount columns."""
+    import pandas as pd
+
+    df = pd.DataFrame.from_records(
+        db.get_expenses_page(limit, offset),
+        columns=EXPENSE_COLUMNS,
+        index='ID',
+    )
+    return df.astype({'Date': 'datetime64[ns]', 'Amount': 'float64'})
+
+@st.cache_data(ttl=60, show_spinner=False)
+def get_expense_count_cached(version):
+    return db.get_expense_count()
+
+@st.cache_data(ttl=60, show_spinner=False)
+def get_business_insights_cached(version):
+    return db.get_business_insights()
+
+@st.cache_data(ttl=60, show_spinner=False)
+def get_category_totals_cached(refresh_generation):
+    import pandas as pd
+
+    return pd.DataFrame.from_records(
+        db.get_category_totals(),
+        columns=["Category", "Amount"],
+    ).astype({'Amount': 'float64'})
+
+@st.cache_data(ttl=60, show_spinner=False)
+def get_monthly_totals_cached(refresh_generation):
+    import pandas as pd
+
+    return pd.DataFrame.from_records(
+        db.get_monthly_totals(),
+        columns=["Month", "Amount"],
+    ).astype({'Amount': 'float64'})
+
+@st.cache_data(ttl=60, show_spinner=False)
+def get_budget_status_cached(month, year, version):
+    import pandas as pd
+
+    return pd.DataFrame.from_records(
+        db.get_budget_status(month, year),
+        columns=["Category", "Monthly Budget", "Annual Budget", "Current Spending"],
+    ).astype({'Monthly Budget': 'float64', 'Annual Budget': 'float64', 'Current Spending': 'float64'})
+
 # --- Helper Functions for Displaying Sections ---
 
+def selectbox_choices(label, options, option_index, stored_value):
+    """
+    Returns the options and index for a selectbox preset to a stored value.
+    A value outside the known options is kept selectable, with a warning,
+    so that saving the form leaves it unchanged.
+    """
+    if stored_value in option_index:
+        return options, option_index[stored_value]
+    st.warning(f"⚠️ This expense has a {label.lower()} that is not in the list: {stored_value}. It is kept unless you choose another.")
+    return options + (stored_value,), len(options)
+
 def display_dashboard():
     """Displays the main financial dashboard with key insights and charts."""
     st.header("Financial Dashboard & Business Insights 📊")
-    insights = db.get_business_insights()
+    insights = get_business_insights_cached(data_version())
     
     if not insights:
         st.warning("No data available for insights. Please add some expenses.")
@@ -50,20 +159,15 @@ def display_dashboard():
     st.markdown("---")
 
     # Display charts
-    expenses_data = db.get_expenses()
-    if expenses_data:
-        df = pd.DataFrame(expenses_data, columns=["ID", "Date", "Amount", "Category", "Payment Method"])
-        df['Date'] = pd.to_datetime(df['Date'])
-        
+    category_spending = get_category_totals_cached(db.refresh_generation)
+    if not category_spending.empty:
         # Pie Chart for category breakdown
         st.subheader("Category-wise Expense Breakdown")
-        category_spending = df.groupby('Category')['Amount'].sum().reset_index()
         st.bar_chart(category_spending.set_index('Category'))
         
         # Line Chart for spending trends
         st.subheader("Spending Trends Over Time")
-        monthly_spending = df.set_index('Date').resample('M')['Amount'].sum().reset_index()
-        monthly_spending['Month'] = monthly_spending['Date'].dt.strftime('%Y-%m')
+        monthly_spending = get_monthly_totals_cached(db.refresh_generation)
         st.line_chart(monthly_spending, x='Month', y='Amount')
 
 def display_add_expense_form():
@@ -73,23 +177,70 @@ def display_add_expense_form():
         col1, col2 = st.columns(2)
         with col1:
             date = st.date_input("Date", value=datetime.date.today())
-            category = st.selectbox("Category", ["Food", "Transport", "Rent", "Entertainment", "Utilities", "Other"])
+            category = st.selectbox("Category", CATEGORIES)
         with col2:
             amount = st.number_input("Amount", min_value=0.0, format="%.2f")
-            payment_method = st.selectbox("Payment Method", ["Credit Card", "Debit Card", "Cash", "Online Transfer"])
+            payment_method = st.selectbox("Payment Method", PAYMENT_METHODS)
         
         submitted = st.form_submit_button("Add Expense")
         if submitted:
             if db.add_expense(date, amount, category, payment_method):
+                bump_data_version()
                 st.success("Expense added successfully! 🎉")
             else:
                 st.error("Failed to add expense. Please try again. 😥")
 
+    st.subheader("Import Expenses from CSV")
+    uploaded_file = st.file_uploader("CSV with Date, Amount, Category and Payment Method columns", type="csv")
+    if uploaded_file is not None and st.button("Import Expenses"):
+        import pandas as pd
+
+        try:
+            imported = pd.read_csv(uploaded_file)[["Date", "Amount", "Category", "Payment Method"]]
+        except (KeyError, ValueError) as e:
+            st.error(f"Could not read the CSV file: {e} 😥")
+            return
+
+        # Validate every row before anything is written
+        if imported.isna().any().any():
+            st.error("Every row needs a Date, Amount, Category and Payment Method. 😥")
+            return
+        try:
+            dates = pd.to_datetime(imported['Date'], errors='raise').dt.date
+            amounts = pd.to_numeric(imported['Amount'], errors='raise').astype(float)
+        except (ValueError, TypeError) as e:
+            st.error(f"Invalid Date or Amount in the CSV file: {e} 😥")
+            return
+        if amounts.isin([float('inf'), float('-inf')]).any():
+            st.error("Amounts must be finite numbers. 😥")
+            return
+        if (amounts < 0).any():
+            st.error("Amounts must not be negative. 😥")
+            return
+        if (amounts >= 1e8).any():
+            st.error("Amounts must be less than 100,000,000. 😥")
+            return
+        unknown_categories = sorted(set(imported['Category']) - set(CATEGORIES))
+        if unknown_categories:
+            st.error(f"Unknown categories: {', '.join(map(str, unknown_categories))}. Use one of: {', '.join(CATEGORIES)}. 😥")
+            return
+        unknown_methods = sorted(set(imported['Payment Method']) - set(PAYMENT_METHODS))
+        if unknown_methods:
+            st.error(f"Unknown payment methods: {', '.join(map(str, unknown_methods))}. Use one of: {', '.join(PAYMENT_METHODS)}. 😥")
+            return
+
+        rows = list(zip(dates, amounts.tolist(), imported['Category'], imported['Payment Method']))
+        if db.add_expenses_bulk(rows):
+            bump_data_version()
+            st.success(f"Imported {len(rows)} expenses successfully! 🎉")
+        else:
+            st.error("Failed to import expenses. Please try again. 😥")
+
 def display_manage_budgets():
     """Displays budget management forms and alerts."""
     st.subheader("Set Budgets")
     with st.form("budget_form", clear_on_submit=True):
-        category = st.selectbox("Category", ["Food", "Transport", "Rent", "Entertainment", "Utilities", "Other"])
+        category = st.selectbox("Category", CATEGORIES)
         col1, col2 = st.columns(2)
         with col1:
             monthly_budget = st.number_input("Monthly Budget", min_value=0.0, format="%.2f")
@@ -98,63 +249,93 @@ def display_manage_budgets():
         submitted = st.form_submit_button("Set Budget")
         if submitted:
             if db.add_budget(category, monthly_budget, annual_budget):
+                bump_data_version()
                 st.success(f"Budget for {category} set successfully! 💰")
             else:
                 st.error("Failed to set budget. Please try again. 😥")
 
     st.markdown("---")
     st.subheader("Budget Tracking & Alerts")
-    budgets = db.get_budgets()
-    
-    if not budgets:
+    current_month = datetime.date.today().month
+    current_year = datetime.date.today().year
+    budgets = get_budget_status_cached(current_month, current_year, data_version())
+
+    if budgets.empty:
         st.info("Please set budgets above to view your budget status.")
         return
 
-    current_month = datetime.date.today().month
-    current_year = datetime.date.today().year
+    # Compute remaining budget and status for every category at once
+    budgets['Remaining'] = budgets['Monthly Budget'] - budgets['Current Spending']
+    exceeded = budgets['Remaining'] < 0
+    nearing = ~exceeded & (budgets['Remaining'] < budgets['Monthly Budget'] * 0.2)
+    budgets['Status'] = "✅ Within budget"
+    budgets.loc[nearing, 'Status'] = "⚠️ Nearing budget"
+    budgets.loc[exceeded, 'Status'] = "🚨 Exceeded"
 
-    for budget_category, monthly_budget, annual_budget in budgets:
-        spending = db.get_monthly_spending_by_category(current_month, current_year)
-        current_spending = next((amount for category, amount in spending if category == budget_category), 0)
-        remaining_budget = monthly_budget - current_spending
-        
-        st.markdown(f"**{budget_category}**")
-        st.markdown(f"**Monthly Budget:** ${monthly_budget:,.2f} | **Current Spending:** ${current_spending:,.2f} | **Remaining:** ${remaining_budget:,.2f}")
-        
-        if remaining_budget < 0:
-            st.warning(f"🚨 **Alert:** You have exceeded your {budget_category} budget by ${-remaining_budget:,.2f}!")
-        elif remaining_budget < monthly_budget * 0.2:
-            st.warning(f"⚠️ **Alert:** You are nearing your {budget_category} budget. Only ${remaining_budget:,.2f} remaining.")
-        else:
-            st.success(f"✅ You are within your {budget_category} budget.")
+    money_format = st.column_config.NumberColumn(format="$%.2f")
+    st.dataframe(
+        budgets[["Category", "Monthly Budget", "Current Spending", "Remaining", "Status"]],
+        hide_index=True,
+        use_container_width=True,
+        column_config={column: money_format for column in ["Monthly Budget", "Current Spending", "Remaining"]},
+    )
+
+    if exceeded.any():
+        over = budgets[exceeded]
+        lines = ("- " + over['Category'] + ": over by $" + (-over['Remaining']).map('{:,.2f}'.format)).tolist()
+        st.warning("🚨 **Alert:** You have exceeded these budgets:\n" + "\n".join(lines))
+    if nearing.any():
+        near = budgets[nearing]
+        lines = ("- " + near['Category'] + ": only $" + near['Remaining'].map('{:,.2f}'.format) + " remaining").tolist()
+        st.warning("⚠️ **Alert:** You are nearing these budgets:\n" + "\n".join(lines))
+    if not (exceeded.any() or nearing.any()):
+        st.success("✅ You are within all of your budgets.")
 
 def display_transactions_crud():
     """Displays a list of all transactions with edit and delete options."""
     st.subheader("All Transactions")
-    expenses_data = db.get_expenses()
-    if not expenses_data:
+    expense_count = get_expense_count_cached(data_version())
+    if not expense_count:
         st.info("No expenses recorded yet.")
         return
 
-    df = pd.DataFrame(expenses_data, columns=["ID", "Date", "Amount", "Category", "Payment Method"])
-    
-    # Display transactions
-    st.dataframe(df.set_index('ID'))
+    # Display one page of transactions
+    page_count = math.ceil(expense_count / TRANSACTIONS_PAGE_SIZE)
+    page = st.number_input(f"Page (of {page_count})", min_value=1, max_value=page_count, value=1, step=1)
+    df = load_expenses_df(TRANSACTIONS_PAGE_SIZE, (page - 1) * TRANSACTIONS_PAGE_SIZE, data_version())
+    st.dataframe(df)
+
+    # Export all transactions. Rows are fetched from the database in chunks,
+    # but st.download_button needs the whole file up front, so the CSV text
+    # itself is still buffered in memory.
+    if st.button("Prepare CSV Export"):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(EXPENSE_COLUMNS)
+        try:
+            writer.writerows(db.iter_expenses())
+        except psycopg2.Error as e:
+            print(f"Error streaming expenses: {e}")
+            st.error("Failed to export expenses. Please try again. 😥")
+        else:
+            st.download_button("Download CSV", buffer.getvalue(), file_name="expenses.csv", mime="text/csv")
 
     # Edit/Delete form
     st.markdown("---")
     st.subheader("Edit or Delete an Expense")
-    expense_ids = df['ID'].tolist()
+    expense_ids = df.index.tolist()
     
     selected_id = st.selectbox("Select Expense ID", expense_ids)
     
     if selected_id:
-        selected_expense = df[df['ID'] == selected_id].iloc[0]
+        selected_expense = df.loc[selected_id]
+        category_options, category_index = selectbox_choices("Category", CATEGORIES, CATEGORY_INDEX, selected_expense['Category'])
+        method_options, method_index = selectbox_choices("Payment Method", PAYMENT_METHODS, PAYMENT_METHOD_INDEX, selected_expense['Payment Method'])
         with st.form("edit_delete_form"):
-            new_date = st.date_input("Date", value=selected_expense['Date'])
+            new_date = st.date_input("Date", value=selected_expense['Date'].date())
             new_amount = st.number_input("Amount", value=float(selected_expense['Amount']), min_value=0.0, format="%.2f")
-            new_category = st.selectbox("Category", ["Food", "Transport", "Rent", "Entertainment", "Utilities", "Other"], index=["Food", "Transport", "Rent", "Entertainment", "Utilities", "Other"].index(selected_expense['Category']))
-            new_payment_method = st.selectbox("Payment Method", ["Credit Card", "Debit Card", "Cash", "Online Transfer"], index=["Credit Card", "Debit Card", "Cash", "Online Transfer"].index(selected_expense['Payment Method']))
+            new_category = st.selectbox("Category", category_options, index=category_index)
+            new_payment_method = st.selectbox("Payment Method", method_options, index=method_index)
 
             col1, col2 = st.columns(2)
             with col1:
@@ -164,6 +345,7 @@ def display_transactions_crud():
 
             if update_btn:
                 if db.update_expense(selected_id, new_date, new_amount, new_category, new_payment_method):
+                    bump_data_version()
                     st.success("Expense updated successfully! 🎉")
                     st.rerun()
                 else:
@@ -171,6 +353,7 @@ def display_transactions_crud():
             
             if delete_btn:
                 if db.delete_expense(selected_id):
+                    bump_data_version()
                     st.success("Expense deleted successfully! 🗑️")
                     st.rerun()
                 else:
@@ -5,6 +5,8 @@ CREATE TABLE IF NOT EXISTS expenses (
     category VARCHAR(50) NOT NULL,
     payment_method VARCHAR(50) NOT NULL
 );
+BEGIN;
+LOCK TABLE expenses IN SHARE ROW EXCLUSIVE MODE;
 CREATE TABLE IF NOT EXISTS budgets (
     id SERIAL PRIMARY KEY,
     category VARCHAR(50) NOT NULL UNIQUE,
@@ -16,4 +18,56 @@ CREATE TABLE IF NOT EXISTS income (
     date DATE NOT NULL,
     amount DECIMAL(10, 2) NOT NULL,
     source VARCHAR(100) NOT NULL
-);
\ No newline at end of file
+);
+CREATE INDEX IF NOT EXISTS idx_expenses_date ON expenses(date);
+CREATE INDEX IF NOT EXISTS idx_expenses_cat_date ON expenses(category, date) INCLUDE (amount);
+CREATE INDEX IF NOT EXISTS idx_expenses_amount ON expenses(amount);
+CREATE TABLE IF NOT EXISTS category_stats (
+    category VARCHAR(50) PRIMARY KEY,
+    total_count BIGINT NOT NULL,
+    total_sum DECIMAL(14, 2) NOT NULL
+);
+INSERT INTO category_stats (category, total_count, total_sum)
+SELECT category, COUNT(*), SUM(amount) FROM expenses GROUP BY category
+ON CONFLICT (category) DO NOTHING;
+CREATE OR REPLACE FUNCTION update_category_stats() RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'TRUNCATE' THEN
+        DELETE FROM category_stats;
+        RETURN NULL;
+    END IF;
+    IF TG_OP IN ('DELETE', 'UPDATE') THEN
+        UPDATE category_stats
+        SET total_count = total_count - 1, total_sum = total_sum - OLD.amount
+        WHERE category = OLD.category;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO category_stats (category, total_count, total_sum)
+        VALUES (NEW.category, 1, NEW.amount)
+        ON CONFLICT (category) DO UPDATE SET
+        total_count = category_stats.total_count + 1,
+        total_sum = category_stats.total_sum + EXCLUDED.total_sum;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+DROP TRIGGER IF EXISTS trg_category_stats ON expenses;
+CREATE TRIGGER trg_category_stats
+AFTER INSERT OR UPDATE OF amount, category OR DELETE ON expenses
+FOR EACH ROW EXECUTE FUNCTION update_category_stats();
+DROP TRIGGER IF EXISTS trg_category_stats_truncate ON expenses;
+CREATE TRIGGER trg_category_stats_truncate
+AFTER TRUNCATE ON expenses
+FOR EACH STATEMENT EXECUTE FUNCTION update_category_stats();
+CREATE MATERIALIZED VIEW IF NOT EXISTS mv_monthly_category AS
+SELECT date_trunc('month', date) AS month, category, SUM(amount) AS total
+FROM expenses
+GROUP BY 1, 2;
+CREATE UNIQUE INDEX IF NOT EXISTS idx_mv_monthly_category ON mv_monthly_category(month, category);
+CREATE TABLE IF NOT EXISTS schema_version (
+    id BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (id),
+    version INTEGER NOT NULL
+);
+INSERT INTO schema_version (version) VALUES (1)
+ON CONFLICT (id) DO UPDATE SET version = EXCLUDED.version;
+COMMIT;
\ No newline at end of file